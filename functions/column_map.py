@@ -0,0 +1,111 @@
+"""Canonical worksheet columns and the header aliases that map onto them.
+
+Shared by ingest (main.py) and the snapshot archive (snapshot_archive.py) so
+both agree on column names and which columns hold text versus metrics.
+"""
+import re
+
+COLUMN_NAME_MAP = {
+    # --- Governor ID mappings ---
+    'Governor id': 'Governor ID', 
+    'Governor ID': 'Governor ID', 
+    'governor_id': 'Governor ID', 
+    'governor id': 'Governor ID', 
+    'Governor Id': 'Governor ID',
+    'Governorid': 'Governor ID', 
+    'GovernorID': 'Governor ID', 
+    'governorid': 'Governor ID', 
+    'GovernorId': 'Governor ID',
+    
+    'Governor Name': 'Governor Name', 
+    'governor_name': 'Governor Name', 
+    'governor name': 'Governor Name', 
+    'Governorname': 'Governor Name', 
+    'GovernorName': 'Governor Name', 
+    'governorname': 'Governor Name', 
+    
+    'power': 'Power',
+
+    'total kp': 'Total KP',
+    'total KP': 'Total KP',
+    'Total Kp': 'Total KP',
+    'Total kp': 'Total KP',
+    'totalkp': 'Total KP',
+    'totalKP': 'Total KP',
+    'TotalKp': 'Total KP',
+    'Totalkp': 'Total KP',
+    'totalKp': 'Total KP',
+    'KP Total': 'Total KP',
+    'Total Kill Points': 'Total KP',
+    'total kill points': 'Total KP',
+    'Total kill points': 'Total KP',
+    'Total killpoints': 'Total KP',
+    'Total KillPoints': 'Total KP',
+    'Total Killpoints': 'Total KP',
+    'Total Kill points': 'Total KP',
+
+    'total dkp': 'Total DKP',
+    'Total Dkp': 'Total DKP',
+    'TotalDKP': 'Total DKP',
+    'TotalDkp': 'Total DKP',
+    'totaldkp': 'Total DKP',
+    'DKP Total': 'Total DKP',
+    'Dkp Total': 'Total DKP',
+    'dkp total': 'Total DKP',
+    'DKPTotal': 'Total DKP',
+    'DkpTotal': 'Total DKP',
+    'dkptotal': 'Total DKP',
+    
+    't4 kills': 'T4 Kills',
+    'T4 Kills': 'T4 Kills',
+    'tier 4 kills': 'T4 Kills',
+    'Tier 4 kills': 'T4 Kills',
+
+    't5 kills': 'T5 Kills',
+    'T5 Kills': 'T5 Kills',
+    'tier 5 kills': 'T5 Kills',
+    'Tier 5 kills': 'T5 Kills',
+
+    'dead': 'Deads',
+    'Dead': 'Deads',
+    'deads': 'Deads',
+    'Deads': 'Deads',
+    'Dead Troops': 'Deads',
+    'dead troops': 'Deads',
+    'DeadTroops': 'Deads',
+    'deadtroops': 'Deads',
+    
+    'alliance tag': 'Alliance',
+    
+    'Helps Given': 'Helps',
+    'HelpsGiven': 'Helps',
+    'helps given': 'Helps',
+    'helpsgiven': 'Helps',
+    
+    'resourcesGathered': 'Resources Gathered',
+    
+    'Lost Kingdom Count': 'Lost Kingdom Count',
+    'LostKingdomCount': 'Lost Kingdom Count',
+    'lost kingdom count': 'Lost Kingdom Count',
+    'lostkingdomcount': 'Lost Kingdom Count',
+    
+    'lkMostKilled': 'LK Most Killed',
+    
+    'lkMostLost': 'LK Most Lost',
+    
+    'lkMostHealed': 'LK Most Healed',
+}
+
+# Headers are matched after lowercasing and dropping whitespace/punctuation, so
+# 'Total Kill Points', 'total_kill_points' and 'TOTAL KILL-POINTS' all resolve
+# through the same COLUMN_NAME_MAP entry.
+def normalize_header(header):
+    return re.sub(r'[^a-z0-9]', '', str(header).lower())
+
+CANONICAL_COLUMNS = list(dict.fromkeys(COLUMN_NAME_MAP.values()))
+# Canonical names resolve to themselves (e.g. a plain 'Alliance' header).
+NORMALIZED_COLUMN_MAP = {normalize_header(c): c for c in CANONICAL_COLUMNS}
+NORMALIZED_COLUMN_MAP.update({normalize_header(alias): canonical for alias, canonical in COLUMN_NAME_MAP.items()})
+# Canonical columns kept as-is; every other canonical column is a metric that
+# is parsed as a number when possible.
+TEXT_COLUMNS = {'Governor ID', 'Governor Name', 'Alliance'}
@@ -2,24 +2,132 @@
 
 Usage (run with the functions venv python):
   python create_user.py <governorId> <password>
+  python create_user.py --bulk <accounts.csv> [workers]
+
+Bulk mode reads a CSV with a `governorId` column and an optional `password`
+column. Rows with a blank password get a generated one, and those credentials
+are written to `<accounts>.credentials.csv` so they can be handed out. Passwords
+are hashed across a process pool and documents are written in batched commits.
+Governor IDs that already have a players_auth document are skipped, and
+passwords already recorded in the credentials file are reused, so an
+interrupted run can simply be started again.
 
 This script writes to Firestore directly using Application Default Credentials or
 the service account available in the environment.
 """
+import os
 import sys
+import csv
 import json
 import bcrypt
 import uuid
+import secrets
+from concurrent.futures import ProcessPoolExecutor
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+MAX_BATCH_SIZE = 499
+
+
+def _hash_password(password):
+    # Top-level so it can be pickled for the process pool.
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def _read_accounts(csv_path):
+    accounts = []
+    seen = set()
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            governor_id = (row.get('governorId') or '').strip()
+            if not governor_id or governor_id in seen:
+                continue
+            seen.add(governor_id)
+            accounts.append((governor_id, (row.get('password') or '').strip()))
+    return accounts
+
+
+def _read_credentials(creds_path):
+    if not os.path.exists(creds_path):
+        return {}
+    with open(creds_path, 'r', encoding='utf-8', newline='') as f:
+        return {row['governorId']: row['password'] for row in csv.DictReader(f)
+                if row.get('governorId') and row.get('password')}
+
+
+def _existing_governor_ids(db, governor_ids):
+    existing = set()
+    refs = [db.collection('players_auth').document(gid) for gid in governor_ids]
+    for i in range(0, len(refs), MAX_BATCH_SIZE):
+        for doc in db.get_all(refs[i:i + MAX_BATCH_SIZE]):
+            if doc.exists:
+                existing.add(doc.id)
+    return existing
+
+
+def bulk_create(db, csv_path, workers=None):
+    accounts = _read_accounts(csv_path)
+    existing = _existing_governor_ids(db, [gid for gid, _ in accounts])
+    pending = [(gid, pw) for gid, pw in accounts if gid not in existing]
+    print(f"Read {len(accounts)} accounts; {len(existing)} already exist, {len(pending)} to create.")
+    if not pending:
+        return 0
+
+    # Reuse passwords generated by an earlier, interrupted run so the
+    # credentials file never holds two passwords for one governor.
+    creds_path = os.path.splitext(csv_path)[0] + '.credentials.csv'
+    recorded = _read_credentials(creds_path)
+
+    generated = []
+    passwords = []
+    for gid, pw in pending:
+        if not pw:
+            pw = recorded.get(gid)
+            if not pw:
+                pw = secrets.token_urlsafe(12)
+                generated.append((gid, pw))
+        passwords.append(pw)
+
+    # Record generated passwords before anything is written so a crash can't
+    # leave accounts nobody knows the password for.
+    if generated:
+        write_header = not os.path.exists(creds_path)
+        with open(creds_path, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(['governorId', 'password'])
+            writer.writerows(generated)
+        print(f"Wrote {len(generated)} generated passwords to {creds_path}")
+
+    created = 0
+    batch = db.batch()
+    batch_size = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        hashes = pool.map(_hash_password, passwords, chunksize=16)
+        for (gid, _), pw_hash in zip(pending, hashes):
+            batch.set(db.collection('players_auth').document(gid), {
+                'password_hash': pw_hash,
+                'uid': str(uuid.uuid4()),
+            }, merge=True)
+            batch_size += 1
+            if batch_size >= MAX_BATCH_SIZE:
+                batch.commit()
+                created += batch_size
+                print(f"Committed {created}/{len(pending)} accounts.")
+                batch = db.batch()
+                batch_size = 0
+    if batch_size > 0:
+        batch.commit()
+        created += batch_size
+        print(f"Committed {created}/{len(pending)} accounts.")
+    return created
+
 
 def main():
     if len(sys.argv) < 3:
         print("Usage: python create_user.py <governorId> <password>")
+        print("       python create_user.py --bulk <accounts.csv> [workers]")
         sys.exit(2)
-    governor_id = sys.argv[1]
-    password = sys.argv[2]
 
     # Initialize Admin SDK if needed
     if not firebase_admin._apps:
@@ -27,6 +135,15 @@ def main():
 
     db = firestore.client()
 
+    if sys.argv[1] == '--bulk':
+        workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        created = bulk_create(db, sys.argv[2], workers)
+        print(f"Created {created} users")
+        return
+
+    governor_id = sys.argv[1]
+    password = sys.argv[2]
+
     pw_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
     uid = str(uuid.uuid4())
 
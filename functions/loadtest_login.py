@@ -0,0 +1,104 @@
+"""Local load-test helper (not an HTTP function): fire concurrent logins at the
+`login` endpoint and report throughput and latency.
+
+Usage (run with the functions venv python, typically against the emulator):
+  python loadtest_login.py <loginUrl> <accounts.csv> [requests] [concurrency]
+  python loadtest_login.py <loginUrl> --range <firstId> <lastId> <password> [requests] [concurrency]
+
+The CSV needs `governorId` and `password` columns (the same layout as
+create_user.py --bulk and its credentials file). Requests cycle through the
+accounts, so while requests <= accounts every login is the first for its ID and
+exercises the Firestore lookup rather than the per-instance cache.
+
+Example:
+  python loadtest_login.py http://127.0.0.1:5001/<project>/us-central1/login --range 100000 101999 secret 2000 100
+
+Only the standard library is used so it can run from any machine.
+"""
+import sys
+import csv
+import json
+import time
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _one_login(url, body):
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = None
+    return status, time.perf_counter() - start
+
+
+def _read_accounts(csv_path):
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        return [((row.get('governorId') or '').strip(), row.get('password') or '')
+                for row in csv.DictReader(f) if (row.get('governorId') or '').strip()]
+
+
+def main():
+    usage = ("Usage: python loadtest_login.py <loginUrl> <accounts.csv> [requests] [concurrency]\n"
+             "       python loadtest_login.py <loginUrl> --range <firstId> <lastId> <password> [requests] [concurrency]")
+    if len(sys.argv) < 3:
+        print(usage)
+        sys.exit(2)
+    url = sys.argv[1]
+    if sys.argv[2] == '--range':
+        if len(sys.argv) < 6:
+            print(usage)
+            sys.exit(2)
+        first_id, last_id, password = int(sys.argv[3]), int(sys.argv[4]), sys.argv[5]
+        accounts = [(str(gid), password) for gid in range(first_id, last_id + 1)]
+        extra = sys.argv[6:]
+    else:
+        accounts = _read_accounts(sys.argv[2])
+        extra = sys.argv[3:]
+    if not accounts:
+        print("No accounts to log in with.")
+        sys.exit(2)
+    total = int(extra[0]) if len(extra) > 0 else 500
+    concurrency = int(extra[1]) if len(extra) > 1 else 50
+
+    bodies = [json.dumps({'governorId': gid, 'password': pw}).encode('utf-8') for gid, pw in accounts]
+
+    print(f"Sending {total} logins for {len(accounts)} accounts to {url} with concurrency {concurrency}...")
+    if total > len(accounts):
+        print("Note: more requests than accounts; repeated IDs may be served from the per-instance cache.")
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: _one_login(url, bodies[i % len(bodies)]), range(total)))
+    wall = time.perf_counter() - wall_start
+
+    ok_latencies = sorted(lat for status, lat in results if status == 200)
+    failures = {}
+    for status, _ in results:
+        if status != 200:
+            failures[status] = failures.get(status, 0) + 1
+
+    print(f"Completed {len(ok_latencies)}/{total} successful logins in {wall:.2f}s")
+    print(f"Throughput: {len(ok_latencies) / wall if wall else 0:.1f} logins/sec")
+    if ok_latencies:
+        print(f"Latency p50: {_percentile(ok_latencies, 50) * 1000:.1f} ms")
+        print(f"Latency p99: {_percentile(ok_latencies, 99) * 1000:.1f} ms")
+        print(f"Latency max: {ok_latencies[-1] * 1000:.1f} ms")
+    if failures:
+        print(f"Failures by status: {failures}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,117 @@
 import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
 import bcrypt
 import firebase_admin
 from firebase_admin import auth, firestore
-from firebase_functions import https_fn
-
-
-@https_fn.on_request()
+from firebase_functions import https_fn, options
+
+
+# How long a players_auth document is served from the per-instance cache.
+# reset_password runs as a separate function on its own instances, so it can't
+# clear this cache: a login that fails against a cached hash re-reads the
+# document (picking up a new password at once), and the short TTL bounds how
+# long an old password keeps working on a warm instance after a reset.
+AUTH_CACHE_TTL_SEC = 5
+# Upper bound on cached players_auth documents per instance; the least
+# recently used entry is evicted past this.
+AUTH_CACHE_MAX_ENTRIES = 5000
+# vCPUs and concurrent requests per login instance. A bcrypt check (cost 12)
+# takes roughly 0.3-0.4s of one core and releases the GIL, so requests only
+# hash in parallel up to the vCPU count. Two requests per vCPU keeps a core
+# busy while the other request waits on Firestore/token signing, and bounds a
+# hash's queueing delay to about one extra check; bursts beyond that scale out
+# to new instances instead of queueing on one. Re-measure with
+# loadtest_login.py when changing these.
+LOGIN_CPU = 2
+LOGIN_CONCURRENCY = 4
+
+# Reused across requests on a warm instance instead of calling
+# firestore.client() every time.
+_db = None
+_db_lock = threading.Lock()
+
+# { governorId: (expires_at, doc_data) } in least-recently-used order. Only
+# existing documents are cached so unknown IDs can't grow it and newly created
+# accounts are visible immediately.
+_auth_cache = OrderedDict()
+_auth_cache_lock = threading.Lock()
+
+
+def get_db():
+    """Return the module-level Firestore client, initializing the Admin SDK on
+    first use.
+    """
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                if not firebase_admin._apps:
+                    firebase_admin.initialize_app()
+                _db = firestore.client()
+    return _db
+
+
+def _cache_player_auth(governor_id, data):
+    with _auth_cache_lock:
+        _auth_cache[governor_id] = (time.monotonic() + AUTH_CACHE_TTL_SEC, data)
+        _auth_cache.move_to_end(governor_id)
+        while len(_auth_cache) > AUTH_CACHE_MAX_ENTRIES:
+            _auth_cache.popitem(last=False)
+
+
+def get_player_auth(governor_id, use_cache=True):
+    """Return (exists, data, cached) for `players_auth/{governor_id}`, served
+    from the per-instance cache while the entry is fresh unless `use_cache` is
+    False. `cached` tells the caller the data may be up to AUTH_CACHE_TTL_SEC old.
+    """
+    with _auth_cache_lock:
+        entry = _auth_cache.get(governor_id)
+        if use_cache and entry and entry[0] > time.monotonic():
+            _auth_cache.move_to_end(governor_id)
+            return True, entry[1], True
+        if entry:
+            del _auth_cache[governor_id]
+
+    doc = get_db().collection('players_auth').document(governor_id).get()
+    if not doc.exists:
+        return False, {}, False
+    data = doc.to_dict() or {}
+    _cache_player_auth(governor_id, data)
+    return True, data, False
+
+
+def _check_password(password, doc_data):
+    pw_hash = doc_data.get('password_hash')
+    if not pw_hash:
+        return False
+    # bcrypt expects bytes
+    if isinstance(pw_hash, str):
+        pw_hash = pw_hash.encode('utf-8')
+    return bcrypt.checkpw(password.encode('utf-8'), pw_hash)
+
+
+@firestore.transactional
+def _assign_uid_txn(transaction, doc_ref, new_uid):
+    # Another instance may have assigned a uid since our read; keep theirs.
+    snapshot = doc_ref.get(transaction=transaction)
+    existing = (snapshot.to_dict() or {}).get('uid') if snapshot.exists else None
+    if existing:
+        return existing
+    transaction.set(doc_ref, {'uid': new_uid}, merge=True)
+    return new_uid
+
+
+# Build decorator args in a version-tolerant way (see main.py): only pass
+# MemoryOption when this firebase_functions release exposes it.
+_login_decorator_kwargs = {'concurrency': LOGIN_CONCURRENCY, 'cpu': LOGIN_CPU}
+if hasattr(options, 'MemoryOption'):
+    _login_decorator_kwargs['memory'] = options.MemoryOption.MB_512
+
+
+@https_fn.on_request(**_login_decorator_kwargs)
 def login(request: https_fn.Request) -> https_fn.Response:
     """POST /login
 
@@ -28,37 +134,32 @@ def login(request: https_fn.Request) -> https_fn.Response:
         if not governor_id or not password:
             return https_fn.Response('Missing governorId or password', status=400)
 
-        # Firestore lookup
-        db = firestore.client()
-        doc_ref = db.collection('players_auth').document(governor_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        # Firestore lookup (cached per instance)
+        exists, doc_data, cached = get_player_auth(governor_id)
+        if not exists:
             return https_fn.Response('Invalid credentials', status=401)
 
-        doc_data = doc.to_dict() or {}
-        pw_hash = doc_data.get('password_hash')
-        if not pw_hash:
-            return https_fn.Response('Invalid credentials', status=401)
-
-        # bcrypt expects bytes
-        if isinstance(pw_hash, str):
-            pw_hash_b = pw_hash.encode('utf-8')
-        else:
-            pw_hash_b = pw_hash
-
-        if not bcrypt.checkpw(password.encode('utf-8'), pw_hash_b):
+        valid = _check_password(password, doc_data)
+        if not valid and cached:
+            # The cached hash may predate a password reset; re-read and retry
+            # only if the stored hash actually changed.
+            old_hash = doc_data.get('password_hash')
+            exists, doc_data, _ = get_player_auth(governor_id, use_cache=False)
+            if exists and doc_data.get('password_hash') != old_hash:
+                valid = _check_password(password, doc_data)
+        if not valid:
             return https_fn.Response('Invalid credentials', status=401)
 
         # Determine internal uid mapping (prefer stored uid to avoid predictable UIDs)
         uid = doc_data.get('uid')
         if not uid:
-            import uuid
-            uid = str(uuid.uuid4())
-            # store the mapping back to Firestore so future logins reuse the same uid
-            try:
-                doc_ref.set({'uid': uid}, merge=True)
-            except Exception:
-                pass
+            # store the mapping back to Firestore so future logins reuse the same uid.
+            # Done in a transaction so concurrent first logins agree on one uid, and
+            # cached only once the write has committed.
+            db = get_db()
+            doc_ref = db.collection('players_auth').document(governor_id)
+            uid = _assign_uid_txn(db.transaction(), doc_ref, str(uuid.uuid4()))
+            _cache_player_auth(governor_id, {**doc_data, 'uid': uid})
 
         # Create custom token using internal uid
         token = auth.create_custom_token(uid)
@@ -73,7 +174,7 @@ def login(request: https_fn.Request) -> https_fn.Response:
         return https_fn.Response(f'Internal server error: {e}', status=500)
 
 
-@https_fn.on_request()
+@https_fn.on_request(**_login_decorator_kwargs)
 def request_password_reset(request: https_fn.Request) -> https_fn.Response:
     """POST /request_password_reset
     Body: { "governorId": "..." }
@@ -89,10 +190,9 @@ def request_password_reset(request: https_fn.Request) -> https_fn.Response:
             return https_fn.Response('Bad Request', status=400)
         governor_id = data['governorId']
 
-        db = firestore.client()
-        doc_ref = db.collection('players_auth').document(governor_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        db = get_db()
+        exists, _, _ = get_player_auth(governor_id)
+        if not exists:
             return https_fn.Response('If the account exists, a reset token has been created.', status=200)
 
         import secrets, time
@@ -109,7 +209,7 @@ def request_password_reset(request: https_fn.Request) -> https_fn.Response:
         return https_fn.Response('Internal server error', status=500)
 
 
-@https_fn.on_request()
+@https_fn.on_request(**_login_decorator_kwargs)
 def reset_password(request: https_fn.Request) -> https_fn.Response:
     """POST /reset_password
     Body: { "resetToken": "...", "newPassword": "..." }
@@ -124,7 +224,7 @@ def reset_password(request: https_fn.Request) -> https_fn.Response:
         token = data['resetToken']
         new_password = data['newPassword']
 
-        db = firestore.client()
+        db = get_db()
         token_doc = db.collection('password_resets').document(token).get()
         if not token_doc.exists:
             return https_fn.Response('Invalid or expired token', status=400)
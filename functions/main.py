@@ -14,9 +14,14 @@ if os.name == 'nt' and not os.environ.get('APPDATA'):
 import re
 import json
 import uuid # <-- NEW: For generating player_ids
+import threading
+from datetime import datetime, timezone
+
+from column_map import CANONICAL_COLUMNS, NORMALIZED_COLUMN_MAP, TEXT_COLUMNS, normalize_header
+from snapshot_archive import archive_worksheet
 
 # New imports for 2nd Gen Cloud Functions
-from firebase_functions import https_fn, options
+from firebase_functions import https_fn, scheduler_fn, options
 # Some installations of firebase_functions may not expose ServiceAccount or set_project_id
 # (version differences). Import defensively and provide no-op fallbacks so local analysis
 # and deployment tooling won't crash if the symbols are missing.
@@ -37,6 +42,8 @@ except Exception:
 # --- Configuration ---
 SERVICE_ACCOUNT_KEY_CONTENT = os.environ.get('SERVICE_ACCOUNT_KEY_JSON')
 KVK_FOLDER_MAPPINGS_JSON = os.environ.get('KVK_FOLDER_MAPPINGS_JSON')
+# Cron or App Engine style schedule for the incremental ingest trigger.
+INGEST_SCHEDULE = os.environ.get('INGEST_SCHEDULE', 'every 30 minutes')
 
 # Fallback: if env vars aren't set, try reading functions/.runtimeconfig.json which
 # the Firebase CLI sometimes uses for local deploy configs. This file may contain
@@ -76,98 +83,65 @@ if not SERVICE_ACCOUNT_KEY_CONTENT or not KVK_FOLDER_MAPPINGS_JSON:
     except Exception as e:
         print(f"Warning: unable to load .runtimeconfig.json fallback: {e}")
 
-COLUMN_NAME_MAP = {
-    # --- Governor ID mappings ---
-    'Governor id': 'Governor ID', 
-    'Governor ID': 'Governor ID', 
-    'governor_id': 'Governor ID', 
-    'governor id': 'Governor ID', 
-    'Governor Id': 'Governor ID',
-    'Governorid': 'Governor ID', 
-    'GovernorID': 'Governor ID', 
-    'governorid': 'Governor ID', 
-    'GovernorId': 'Governor ID',
-    
-    'Governor Name': 'Governor Name', 
-    'Governor Name': 'Governor Name', 
-    'governor_name': 'Governor Name', 
-    'governor name': 'Governor Name', 
-    'Governorname': 'Governor Name', 
-    'GovernorName': 'Governor Name', 
-    'governorname': 'Governor Name', 
-    
-    'power': 'Power',
-    'power': 'Power',
-
-    'total kp': 'Total KP',
-    'total KP': 'Total KP',
-    'Total Kp': 'Total KP',
-    'Total kp': 'Total KP',
-    'totalkp': 'Total KP',
-    'totalKP': 'Total KP',
-    'TotalKp': 'Total KP',
-    'Totalkp': 'Total KP',
-    'totalKp': 'Total KP',
-    'KP Total': 'Total KP',
-    'Total Kill Points': 'Total KP',
-    'total kill points': 'Total KP',
-    'Total kill points': 'Total KP',
-    'Total killpoints': 'Total KP',
-    'Total KillPoints': 'Total KP',
-    'Total Killpoints': 'Total KP',
-    'Total Kill points': 'Total KP',
-
-    'total dkp': 'Total DKP',
-    'Total Dkp': 'Total DKP',
-    'TotalDKP': 'Total DKP',
-    'TotalDkp': 'Total DKP',
-    'totaldkp': 'Total DKP',
-    'DKP Total': 'Total DKP',
-    'Dkp Total': 'Total DKP',
-    'dkp total': 'Total DKP',
-    'DKPTotal': 'Total DKP',
-    'DkpTotal': 'Total DKP',
-    'dkptotal': 'Total DKP',
-    
-    't4 kills': 'T4 Kills',
-    'T4 Kills': 'T4 Kills',
-    'tier 4 kills': 'T4 Kills',
-    'Tier 4 kills': 'T4 Kills',
-
-    't5 kills': 'T5 Kills',
-    'T5 Kills': 'T5 Kills',
-    'tier 5 kills': 'T5 Kills',
-    'Tier 5 kills': 'T5 Kills',
-
-    'dead': 'Deads',
-    'Dead': 'Deads',
-    'deads': 'Deads',
-    'Deads': 'Deads',
-    'Dead Troops': 'Deads',
-    'dead troops': 'Deads',
-    'DeadTroops': 'Deads',
-    'deadtroops': 'Deads',
-    
-    'alliance tag': 'Alliance',
-    
-    'Helps Given': 'Helps',
-    'HelpsGiven': 'Helps',
-    'helps given': 'Helps',
-    'helpsgiven': 'Helps',
-    
-    'resourcesGathered': 'Resources Gathered',
-    
-    'Lost Kingdom Count': 'Lost Kingdom Count',
-    'LostKingdomCount': 'Lost Kingdom Count',
-    'lost kingdom count': 'Lost Kingdom Count',
-    'lostkingdomcount': 'Lost Kingdom Count',
-    
-    'lkMostKilled': 'LK Most Killed',
-    
-    'lkMostLost': 'LK Most Lost',
-    
-    'lkMostHealed': 'LK Most Healed',
-}
+# --- Header resolution ---
+_NUMERIC_TEXT_RE = r'\d+(?:\.\d*)?|\.\d+'
+
+# { header signature tuple: ((source_header, canonical_column, kind), ...) }
+# Kept for the life of the instance so every worksheet sharing a layout (all
+# the tabs of a spreadsheet, usually) reuses the plan built for the first one.
+_header_plan_cache = {}
+
+def resolve_header_plan(headers):
+    """Return the column plan for a worksheet's header row: a tuple of
+    (source_header, canonical_column, kind) where kind is 'text' or 'numeric'.
+    Unrecognized headers are dropped; if several headers map to the same
+    canonical column the first one wins.
+    """
+    signature = tuple(str(h) for h in headers)
+    plan = _header_plan_cache.get(signature)
+    if plan is not None:
+        return plan
+
+    seen = set()
+    entries = []
+    for header in signature:
+        canonical = NORMALIZED_COLUMN_MAP.get(normalize_header(header))
+        if not canonical or canonical in seen:
+            continue
+        seen.add(canonical)
+        entries.append((header, canonical, 'text' if canonical in TEXT_COLUMNS else 'numeric'))
+    plan = tuple(entries)
+    _header_plan_cache[signature] = plan
+    print(f"    Resolved header layout: {[canonical for _, canonical, _ in plan]}")
+    return plan
+
+def _clean_numeric_column(series):
+    # Strings like '1,234' or '12.5' become int/float; anything else (free
+    # text, NaN) is passed through unchanged. Parsing is done column-wide.
+    import pandas as pd
+    text = series.astype(str).str.replace(',', '', regex=False)
+    numeric = text.str.fullmatch(_NUMERIC_TEXT_RE)
+    has_dot = text.str.contains('.', regex=False)
+    values = series.astype(object).copy()
+    try:
+        # Parse only the matching subsets: a NaN-padded column would go through
+        # float64 and round integers above 2**53. Values past int64 come back as
+        # exact Python ints in an object column.
+        for mask in (numeric & ~has_dot, numeric & has_dot):
+            if mask.any():
+                values[mask] = pd.to_numeric(text[mask]).tolist()
+    except (ValueError, TypeError, OverflowError) as e:
+        print(f"    Warning: could not parse column '{series.name}' as numbers ({e}); keeping raw values.")
+        return series.tolist()
+    return values.tolist()
+
+def apply_header_plan(df, plan):
+    """Return { canonical_column: [python values] } for the columns in plan."""
+    columns = {}
+    for source, canonical, kind in plan:
+        series = df[source]
+        columns[canonical] = _clean_numeric_column(series) if kind == 'numeric' else series.tolist()
+    return columns
 
 MAX_BATCH_SIZE = 499
 
@@ -262,7 +236,7 @@ def list_google_sheets_in_folder(drive_svc, folder_id):
         return []
     try:
         query = f"'{folder_id}' in parents and mimeType='application/vnd.google-apps.spreadsheet' and trashed=false"
-        results = drive_svc.files().list(q=query, fields="files(id, name)").execute()
+        results = drive_svc.files().list(q=query, fields="files(id, name, modifiedTime)").execute()
         sheets = results.get('files', [])
         return sheets
     except HttpError as e:
@@ -273,12 +247,36 @@ def list_google_sheets_in_folder(drive_svc, folder_id):
         return []
 
 # --- Player Registry Management (in-memory) ---
-# This will be loaded at the start of the function and updated in memory
+# This will be loaded at the start of the function and updated in memory. On a
+# warm instance the registry and its lookup indexes are kept between runs and
+# only reloaded when `players_registry/meta.version` no longer matches.
 player_registry = {} # { player_id: { primaryName, knownGovernorIds, knownGovernorNames, activeKvkMap, ... } }
+governor_id_index = {} # { governor_id: player_id }
+governor_name_index = {} # { governor_name: [player_id, ...] }
+player_registry_version = None # version stamp the in-memory registry corresponds to
+
+def _rebuild_registry_indexes():
+    global governor_id_index, governor_name_index
+    governor_id_index = {}
+    governor_name_index = {}
+    for pid, p_data in player_registry.items():
+        for gid in p_data.get('knownGovernorIds', []):
+            governor_id_index.setdefault(gid, pid)
+        for name in p_data.get('knownGovernorNames', []):
+            governor_name_index.setdefault(name, []).append(pid)
+
+def _read_registry_version():
+    doc = db.collection('players_registry').document('meta').get()
+    return (doc.to_dict() or {}).get('version') if doc.exists else None
 
 def load_player_registry():
-    global player_registry
+    global player_registry, player_registry_version
     try:
+        version = _read_registry_version()
+        if version is not None and version == player_registry_version:
+            print(f"Reusing cached player registry ({len(player_registry)} players, version {version}).")
+            return
+
         doc_ref = db.collection('players_registry').document('main')
         doc = doc_ref.get()
         if doc.exists:
@@ -287,17 +285,60 @@ def load_player_registry():
         else:
             player_registry = {}
             print("No existing player registry found. Starting fresh.")
+        player_registry_version = version
     except Exception as e:
         print(f"Error loading player registry: {e}. Starting with empty registry.")
         player_registry = {}
+        player_registry_version = None
+    _rebuild_registry_indexes()
 
 def save_player_registry():
+    """Write the registry back, but only if nobody else saved it since it was
+    loaded (HTTP and scheduled ingest can overlap on different instances).
+    Returns False when the save failed or was rejected; the caller should fail
+    the run so it is retried against the newer registry.
+    """
+    global player_registry_version
     try:
-        doc_ref = db.collection('players_registry').document('main')
-        doc_ref.set(player_registry) # Overwrites the entire document
-        print(f"Saved {len(player_registry)} players to registry.")
+        from firebase_admin import firestore
+
+        @firestore.transactional
+        def _save_if_unchanged(transaction, expected_version, new_version):
+            main_ref = db.collection('players_registry').document('main')
+            meta_ref = db.collection('players_registry').document('meta')
+            meta = meta_ref.get(transaction=transaction)
+            current_version = (meta.to_dict() or {}).get('version') if meta.exists else None
+            if current_version != expected_version:
+                return False
+            transaction.set(main_ref, player_registry) # Overwrites the entire document
+            transaction.set(meta_ref, {
+                'version': new_version,
+                'updatedAt': firestore.SERVER_TIMESTAMP,
+            })
+            return True
+
+        version = str(uuid.uuid4())
+        if not _save_if_unchanged(db.transaction(), player_registry_version, version):
+            print(f"Player registry changed since it was loaded (expected version {player_registry_version}); not overwriting.")
+            player_registry_version = None
+            return False
+        player_registry_version = version
+        # The in-memory copy still holds SERVER_TIMESTAMP sentinels; swap them for
+        # the local time so a later save from this warm instance doesn't reset
+        # createdAt to the time of that save.
+        now = datetime.now(timezone.utc)
+        for p_data in player_registry.values():
+            for key, value in p_data.items():
+                if value is firestore.SERVER_TIMESTAMP:
+                    p_data[key] = now
+        print(f"Saved {len(player_registry)} players to registry (version {version}).")
+        return True
     except Exception as e:
+        # Force a full reload next run rather than trusting a registry that may
+        # not match what is stored.
+        player_registry_version = None
         print(f"Error saving player registry: {e}")
+        return False
 
 # Resolves Governor ID/Name to a player_id, updating registry if needed
 def resolve_player(governor_id, governor_name, kvk_identifier):
@@ -308,18 +349,12 @@ def resolve_player(governor_id, governor_name, kvk_identifier):
     found_player_id = None
     
     # --- Attempt 1: Find by Governor ID ---
-    for pid, p_data in player_registry.items():
-        if norm_governor_id in p_data.get('knownGovernorIds', []):
-            found_player_id = pid
-            break
+    found_player_id = governor_id_index.get(norm_governor_id)
     
     # --- Attempt 2: Find by Governor Name (if not found by ID) ---
     if not found_player_id:
         # Collect all player_ids that have this name in their history
-        matching_pids_by_name = []
-        for pid, p_data in player_registry.items():
-            if norm_governor_name in p_data.get('knownGovernorNames', []):
-                matching_pids_by_name.append(pid)
+        matching_pids_by_name = governor_name_index.get(norm_governor_name, [])
         
         if len(matching_pids_by_name) == 1:
             found_player_id = matching_pids_by_name[0]
@@ -340,6 +375,8 @@ def resolve_player(governor_id, governor_name, kvk_identifier):
             'createdAt': firestore.SERVER_TIMESTAMP,
         }
         found_player_id = new_pid
+        governor_id_index[norm_governor_id] = new_pid
+        governor_name_index.setdefault(norm_governor_name, []).append(new_pid)
         print(f"New player created: {norm_governor_name} (ID: {norm_governor_id}) -> Player_ID: {found_player_id}")
     else: # Existing player, update their profile
         player_data = player_registry[found_player_id]
@@ -347,11 +384,13 @@ def resolve_player(governor_id, governor_name, kvk_identifier):
         # Add ID if new
         if norm_governor_id not in player_data['knownGovernorIds']:
             player_data['knownGovernorIds'].append(norm_governor_id)
+            governor_id_index.setdefault(norm_governor_id, found_player_id)
             print(f"  Added new Governor ID '{norm_governor_id}' to player '{player_data['primaryName']}' ({found_player_id})")
 
         # Add Name if new
         if norm_governor_name not in player_data['knownGovernorNames']:
             player_data['knownGovernorNames'].append(norm_governor_name)
+            governor_name_index.setdefault(norm_governor_name, []).append(found_player_id)
             print(f"  Added new Governor Name '{norm_governor_name}' to player '{player_data['primaryName']}' ({found_player_id})")
         
     # Update common fields for existing/new player
@@ -366,25 +405,29 @@ def resolve_player(governor_id, governor_name, kvk_identifier):
 
 
 # --- Core Processing Function for a single Google Sheet ---
+# Returns (entries_uploaded, succeeded). `succeeded` is False if the sheet could
+# not be opened, a worksheet could not be read, or any batch commit failed, so
+# incremental ingest knows to retry the sheet on its next run.
 def process_single_google_sheet(spreadsheet_id: str, spreadsheet_name: str, kvk_identifier: str): 
     global player_registry # Access the global registry
     if not gc:
         print(f"gspread not initialized. Cannot process sheet ID: {spreadsheet_id}")
-        return 0
+        return 0, False
 
     total_entries_uploaded = 0
+    succeeded = True
     try:
         spreadsheet = gc.open_by_id(spreadsheet_id)
         print(f"  Opened spreadsheet: {spreadsheet.title}")
     except gspread.exceptions.SpreadsheetNotFound:
         print(f"  Error: Google Sheet ID '{spreadsheet_id}' not found. Skipping.")
-        return 0
+        return 0, False
     except gspread.exceptions.APIError as e:
         print(f"  Error accessing Google Sheet '{spreadsheet_id}': {e}. Skipping.")
-        return 0
+        return 0, False
     except Exception as e:
         print(f"  An unexpected error occurred opening sheet '{spreadsheet_id}': {e}. Skipping.")
-        return 0
+        return 0, False
 
     for worksheet in spreadsheet.worksheets():
         current_sheet_name = worksheet.title
@@ -420,14 +463,18 @@ def process_single_google_sheet(spreadsheet_id: str, spreadsheet_name: str, kvk_
             df = pd.DataFrame(records)
         except Exception as e:
             print(f"    Error reading data from worksheet '{current_sheet_name}': {e}. Skipping.")
+            succeeded = False
             continue
 
-        df.rename(columns=COLUMN_NAME_MAP, inplace=True)
+        plan = resolve_header_plan(df.columns)
+        columns = apply_header_plan(df, plan)
 
         batch = db.batch()
         batch_size = 0
+        archive_rows = [] # Rows mirrored to the columnar snapshot archive
         
-        for index, row in df.iterrows():
+        for index in range(len(df)):
+            row = {canonical: values[index] for canonical, values in columns.items()}
             governor_id_raw = row.get('Governor ID')
             governor_name_raw = row.get('Governor Name')
 
@@ -455,21 +502,11 @@ def process_single_google_sheet(spreadsheet_id: str, spreadsheet_name: str, kvk_
                 'sourceWorksheet': current_sheet_name,
             }
             
-            for col_alias in COLUMN_NAME_MAP.values():
+            for col_alias in CANONICAL_COLUMNS:
                 if col_alias not in ['Governor ID', 'Governor Name']:
                     value = row.get(col_alias)
                     if pd.notna(value):
-                        if isinstance(value, str):
-                            cleaned_value = value.replace(',', '')
-                            if cleaned_value.replace('.', '', 1).isdigit():
-                                if '.' in cleaned_value:
-                                    kvk_snapshot_data[col_alias] = float(cleaned_value)
-                                else:
-                                    kvk_snapshot_data[col_alias] = int(cleaned_value)
-                            else:
-                                kvk_snapshot_data[col_alias] = value
-                        else:
-                            kvk_snapshot_data[col_alias] = value
+                        kvk_snapshot_data[col_alias] = value
 
             kvk_snapshot_data_to_upload = {k: v for k, v in kvk_snapshot_data.items() if pd.notna(v)}
 
@@ -482,6 +519,7 @@ def process_single_google_sheet(spreadsheet_id: str, spreadsheet_name: str, kvk_
             # This avoids conflicts and makes batch simpler.
             
             batch.set(kvk_snapshot_doc_ref, kvk_snapshot_data_to_upload)
+            archive_rows.append({'playerId': player_id, **kvk_snapshot_data_to_upload})
             batch_size += 1
             total_entries_uploaded += 1
 
@@ -493,15 +531,20 @@ def process_single_google_sheet(spreadsheet_id: str, spreadsheet_name: str, kvk_
                     batch_size = 0
                 except Exception as e:
                     print(f"      Error committing batch for worksheet '{current_sheet_name}': {e}")
+                    succeeded = False
         if batch_size > 0:
             try:
                 batch.commit()
                 print(f"      Committed final {batch_size} operations for worksheet '{current_sheet_name}'.")
             except Exception as e:
                 print(f"      Error committing final batch for worksheet '{current_sheet_name}': {e}")
+                succeeded = False
+
+        # --- Append this worksheet to the per-KVK columnar archive in Storage ---
+        archive_worksheet(kvk_identifier, snapshot_date_id, spreadsheet_id, current_sheet_name, archive_rows)
 
     print(f"  Finished processing Google Sheet file: '{spreadsheet_name}'")
-    return total_entries_uploaded
+    return total_entries_uploaded, succeeded
 
 # --- Cloud Function Entry Point ---
 # Build decorator args in a version-tolerant way: some firebase_functions
@@ -524,10 +567,36 @@ except Exception:
     pass
 
 
-@https_fn.on_request(**_https_decorator_kwargs)
-def process_kvk_spreadsheets(request: https_fn.Request) -> https_fn.Response:
-    print("Cloud Function 'process_kvk_spreadsheets' triggered.")
+# --- Incremental ingest state ---
+# `ingest_state/sheets` maps spreadsheet ID -> Drive modifiedTime of the version
+# last ingested, so scheduled runs only reprocess sheets that changed.
+def load_ingest_state():
+    try:
+        doc = db.collection('ingest_state').document('sheets').get()
+        return (doc.to_dict() or {}) if doc.exists else {}
+    except Exception as e:
+        print(f"Error loading ingest state: {e}. Treating all sheets as changed.")
+        return {}
+
+def save_ingest_state(processed):
+    if not processed:
+        return
+    try:
+        db.collection('ingest_state').document('sheets').set(processed, merge=True)
+    except Exception as e:
+        print(f"Error saving ingest state: {e}")
+
 
+# Concurrent invocations on one instance share the in-memory registry, so only
+# one ingest may run at a time per instance.
+_ingest_lock = threading.Lock()
+
+def run_ingest(incremental=False):
+    """Process every KVK folder in KVK_FOLDER_MAPPINGS_JSON. With `incremental`,
+    spreadsheets whose Drive modifiedTime matches the last ingested one are
+    skipped, and the registry is not touched when nothing changed.
+    Returns (status_code, message).
+    """
     # Lazy-initialize external services to avoid import-time side effects during
     # the Firebase Functions analysis phase which can time out.
     init_services()
@@ -535,12 +604,12 @@ def process_kvk_spreadsheets(request: https_fn.Request) -> https_fn.Response:
     if not KVK_FOLDER_MAPPINGS_JSON:
         error_msg = "Error: KVK_FOLDER_MAPPINGS_JSON environment variable not set."
         print(error_msg)
-        return https_fn.Response(error_msg, status=500)
+        return 500, error_msg
 
     if not gc or not drive_service:
         error_msg = "Error: gspread or Drive API service not initialized (check SERVICE_ACCOUNT_KEY_JSON)."
         print(error_msg)
-        return https_fn.Response(error_msg, status=500)
+        return 500, error_msg
 
     try:
         kvk_folder_map = json.loads(KVK_FOLDER_MAPPINGS_JSON)
@@ -549,34 +618,78 @@ def process_kvk_spreadsheets(request: https_fn.Request) -> https_fn.Response:
     except (json.JSONDecodeError, ValueError) as e:
         error_msg = f"Error parsing KVK_FOLDER_MAPPINGS_JSON: {e}. Ensure it's a valid JSON string."
         print(error_msg)
-        return https_fn.Response(error_msg, status=500)
+        return 500, error_msg
 
-    # --- Load the player registry at the beginning of the function run ---
-    load_player_registry()
+    with _ingest_lock:
+        ingest_state = load_ingest_state() if incremental else {}
 
-    total_sheets_processed = 0
-    total_entries_uploaded = 0
+        # --- Collect the sheets to process before loading the registry ---
+        work = []
+        for folder_id, kvk_identifier in kvk_folder_map.items():
+            print(f"\n--- Processing KVK '{kvk_identifier}' from Folder ID: {folder_id} ---")
+            sheets_in_kvk_folder = list_google_sheets_in_folder(drive_service, folder_id)
 
-    for folder_id, kvk_identifier in kvk_folder_map.items():
-        print(f"\n--- Processing KVK '{kvk_identifier}' from Folder ID: {folder_id} ---")
-        sheets_in_kvk_folder = list_google_sheets_in_folder(drive_service, folder_id)
-        
-        if not sheets_in_kvk_folder:
-            print(f"No sheets found for KVK '{kvk_identifier}' in folder '{folder_id}'.")
-            continue
+            if not sheets_in_kvk_folder:
+                print(f"No sheets found for KVK '{kvk_identifier}' in folder '{folder_id}'.")
+                continue
 
-        for sheet_info in sheets_in_kvk_folder:
+            for sheet_info in sheets_in_kvk_folder:
+                modified_time = sheet_info.get('modifiedTime')
+                if incremental and modified_time and ingest_state.get(sheet_info['id']) == modified_time:
+                    print(f"  Skipping unchanged spreadsheet: '{sheet_info['name']}' (ID: {sheet_info['id']})")
+                    continue
+                work.append((sheet_info, kvk_identifier))
+
+        if not work:
+            print("\nNo new or changed spreadsheets to process.")
+            return 200, "No new or changed spreadsheets to process."
+
+        # --- Load the player registry (reuses the warm copy when unchanged) ---
+        load_player_registry()
+
+        total_sheets_processed = 0
+        total_entries_uploaded = 0
+        processed_state = {}
+
+        for sheet_info, kvk_identifier in work:
             total_sheets_processed += 1
             spreadsheet_id = sheet_info['id']
             spreadsheet_name = sheet_info['name']
             print(f"  Processing spreadsheet: '{spreadsheet_name}' (ID: {spreadsheet_id}) for KVK '{kvk_identifier}'")
-            
-            uploaded_count = process_single_google_sheet(spreadsheet_id, spreadsheet_name, kvk_identifier)
+
+            uploaded_count, succeeded = process_single_google_sheet(spreadsheet_id, spreadsheet_name, kvk_identifier)
             total_entries_uploaded += uploaded_count
-        
-    # --- Save the updated player registry at the end of the function run ---
-    save_player_registry()
+            # Only fully ingested sheets are marked; failed ones are retried next run.
+            if succeeded and sheet_info.get('modifiedTime'):
+                processed_state[spreadsheet_id] = sheet_info['modifiedTime']
+            elif not succeeded:
+                print(f"  Spreadsheet '{spreadsheet_name}' did not fully ingest; it will be retried.")
+
+        # --- Save the updated player registry at the end of the run ---
+        # The snapshots reference player_ids from this registry, so sheets are only
+        # marked as ingested once the registry itself has been saved. A failed or
+        # rejected save fails the run so it is retried with a fresh registry.
+        if not save_player_registry():
+            error_msg = "Error: player registry was not saved; run will be retried."
+            print(error_msg)
+            return 500, error_msg
+        save_ingest_state(processed_state)
+
+    print(f"\nIngest finished. Total sheets processed: {total_sheets_processed}. Total entries uploaded: {total_entries_uploaded}")
+    return 200, f"Successfully processed {total_sheets_processed} sheets. Total entries: {total_entries_uploaded}"
+
+
+@https_fn.on_request(**_https_decorator_kwargs)
+def process_kvk_spreadsheets(request: https_fn.Request) -> https_fn.Response:
+    print("Cloud Function 'process_kvk_spreadsheets' triggered.")
+    status, message = run_ingest()
+    return https_fn.Response(message, status=status)
 
-    print(f"\nCloud Function finished. Total sheets processed: {total_sheets_processed}. Total entries uploaded: {total_entries_uploaded}")
-    return https_fn.Response(f"Successfully processed {total_sheets_processed} sheets. Total entries: {total_entries_uploaded}", status=200)
 
+@scheduler_fn.on_schedule(schedule=INGEST_SCHEDULE, **_https_decorator_kwargs)
+def scheduled_kvk_ingest(event: scheduler_fn.ScheduledEvent) -> None:
+    print(f"Scheduled ingest triggered at {event.schedule_time}.")
+    status, message = run_ingest(incremental=True)
+    if status != 200:
+        # Raising marks the run as failed so Cloud Scheduler retry/alerting applies.
+        raise RuntimeError(message)
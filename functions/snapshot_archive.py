@@ -0,0 +1,188 @@
+"""Columnar archive of processed worksheets in Cloud Storage.
+
+Ingest writes every processed worksheet as one Parquet file under
+
+  <SNAPSHOT_ARCHIVE_PREFIX>/<kvkIdentifier>/snapshotDateId=<YYYY-MM-DD>/<spreadsheetId>-<worksheet>.parquet
+
+so each KVK is a hive-partitioned dataset keyed by snapshotDateId. Re-running
+ingest overwrites the same objects, so the archive never double counts. Every
+file is written with archive_schema() (metrics as float64, identifiers as
+string, missing columns as nulls) so files from different tabs always combine.
+Archiving is disabled unless SNAPSHOT_ARCHIVE_BUCKET is set.
+
+Analytics helpers (run locally, not as HTTP functions):
+  download_archive(kvk_identifier, dest_dir)  -> sync one KVK's files to disk
+  read_archive(path, columns=None, snapshot_dates=None)  -> pandas DataFrame
+
+read_archive memory-maps the local files and only decodes the requested
+columns/partitions, so season-wide aggregates don't touch Firestore at all.
+"""
+import os
+import re
+import json
+
+from column_map import CANONICAL_COLUMNS, TEXT_COLUMNS
+
+SNAPSHOT_ARCHIVE_BUCKET = os.environ.get('SNAPSHOT_ARCHIVE_BUCKET')
+SNAPSHOT_ARCHIVE_PREFIX = os.environ.get('SNAPSHOT_ARCHIVE_PREFIX', 'snapshot_archive')
+
+# Text fields stored alongside the canonical columns. snapshotDateId is not a
+# file column; it comes from the partition path.
+_METADATA_FIELDS = ['playerId', 'kvkIdentifier', 'sourceSpreadsheet', 'sourceWorksheet']
+PARTITION_FIELD = 'snapshotDateId'
+
+_warned_no_bucket = False
+
+
+def archive_fields():
+    """Return [(column, 'text' | 'numeric')] in file column order."""
+    fields = [(name, 'text') for name in _METADATA_FIELDS]
+    fields += [(name, 'text' if name in TEXT_COLUMNS else 'numeric') for name in CANONICAL_COLUMNS]
+    return fields
+
+
+def archive_schema(with_partition=False):
+    import pyarrow as pa
+    fields = [pa.field(name, pa.string() if kind == 'text' else pa.float64()) for name, kind in archive_fields()]
+    if with_partition:
+        fields.append(pa.field(PARTITION_FIELD, pa.string()))
+    return pa.schema(fields)
+
+
+def _get_bucket():
+    from firebase_admin import storage
+    return storage.bucket(SNAPSHOT_ARCHIVE_BUCKET)
+
+
+def _to_float(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        result = float(str(value).replace(',', '')) if isinstance(value, str) else float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if result != result else result  # NaN -> null
+
+
+def _to_text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value).strip()
+
+
+def _safe_name(value):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(value)).strip('_') or 'sheet'
+
+
+def archive_blob_name(kvk_identifier, snapshot_date_id, spreadsheet_id, worksheet_name):
+    return (
+        f"{SNAPSHOT_ARCHIVE_PREFIX}/{_safe_name(kvk_identifier)}/"
+        f"snapshotDateId={snapshot_date_id}/"
+        f"{_safe_name(spreadsheet_id)}-{_safe_name(worksheet_name)}.parquet"
+    )
+
+
+def archive_worksheet(kvk_identifier, snapshot_date_id, spreadsheet_id, worksheet_name, rows):
+    """Write the processed rows of one worksheet to the archive.
+
+    `rows` are the snapshot dicts uploaded to Firestore plus a `playerId` key.
+    Returns the number of rows archived (0 if skipped or on failure); errors are
+    logged and swallowed so archiving never fails the ingest run.
+    """
+    global _warned_no_bucket
+    if not rows:
+        return 0
+    if not SNAPSHOT_ARCHIVE_BUCKET:
+        if not _warned_no_bucket:
+            print("    Warning: SNAPSHOT_ARCHIVE_BUCKET is not set; snapshot archive is disabled.")
+            _warned_no_bucket = True
+        return 0
+    try:
+        import io
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except Exception as e:
+        print(f"    Warning: pyarrow not available, skipping snapshot archive: {e}")
+        return 0
+
+    try:
+        columns = {}
+        for name, kind in archive_fields():
+            convert = _to_text if kind == 'text' else _to_float
+            columns[name] = [convert(row.get(name)) for row in rows]
+        table = pa.Table.from_pydict(columns, schema=archive_schema())
+
+        buf = io.BytesIO()
+        pq.write_table(table, buf, compression='zstd')
+
+        blob_name = archive_blob_name(kvk_identifier, snapshot_date_id, spreadsheet_id, worksheet_name)
+        _get_bucket().blob(blob_name).upload_from_string(buf.getvalue(), content_type='application/octet-stream')
+        print(f"    Archived {table.num_rows} rows to gs://{SNAPSHOT_ARCHIVE_BUCKET}/{blob_name}")
+        return table.num_rows
+    except Exception as e:
+        print(f"    Error archiving worksheet '{worksheet_name}': {e}")
+        return 0
+
+
+# Kept next to (not inside) the local dataset so read_archive never sees it.
+_MANIFEST_SUFFIX = '.manifest.json'
+
+
+def download_archive(kvk_identifier, dest_dir):
+    """Mirror one KVK's archive into `dest_dir`, fetching only files that are
+    missing locally or whose object generation changed since the last sync.
+    Returns the local dataset path.
+    """
+    if not SNAPSHOT_ARCHIVE_BUCKET:
+        raise ValueError("SNAPSHOT_ARCHIVE_BUCKET must be set to download the snapshot archive.")
+    prefix = f"{SNAPSHOT_ARCHIVE_PREFIX}/{_safe_name(kvk_identifier)}/"
+    local_root = os.path.join(dest_dir, _safe_name(kvk_identifier))
+    # { blob name: generation } of the objects last downloaded. Re-ingesting a
+    # sheet overwrites the same object (often at the same size) with a new
+    # generation, so the generation is what tells a stale local copy apart.
+    manifest_path = local_root + _MANIFEST_SUFFIX
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    fetched = 0
+    try:
+        for blob in _get_bucket().list_blobs(prefix=prefix):
+            local_path = os.path.join(local_root, *blob.name[len(prefix):].split('/'))
+            if os.path.exists(local_path) and manifest.get(blob.name) == blob.generation:
+                continue
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            # Pin the generation listed so the manifest matches what was fetched.
+            blob.download_to_filename(local_path, if_generation_match=blob.generation)
+            manifest[blob.name] = blob.generation
+            fetched += 1
+    finally:
+        os.makedirs(dest_dir, exist_ok=True)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+    print(f"Synced archive for '{kvk_identifier}' to {local_root} ({fetched} files downloaded).")
+    return local_root
+
+
+def read_archive(path, columns=None, snapshot_dates=None):
+    """Load a local archive directory (or a single Parquet file) into pandas.
+
+    Only `columns` are decoded (all when None) and, when `snapshot_dates` is
+    given, only those snapshotDateId partitions are read. Files are memory-mapped.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    partitioning = ds.partitioning(pa.schema([pa.field(PARTITION_FIELD, pa.string())]), flavor='hive')
+    dataset = ds.dataset(
+        path,
+        schema=archive_schema(with_partition=True),
+        format='parquet',
+        partitioning=partitioning,
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+    flt = None
+    if snapshot_dates:
+        flt = ds.field(PARTITION_FIELD).isin(list(snapshot_dates))
+    return dataset.to_table(columns=columns, filter=flt).to_pandas()